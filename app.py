@@ -1,136 +1,228 @@
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
-import json
-import time
-from typing import List, Dict, Set
-import logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-class CapillaryDocScraper:
-    def __init__(self, base_url: str = "https://docs.capillarytech.com/"):
-        self.base_url = base_url
-        self.visited_urls: Set[str] = set()
-        self.scraped_data: List[Dict] = []
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-    
-    def is_valid_url(self, url: str) -> bool:
-        """Check if URL belongs to the documentation domain"""
-        parsed = urlparse(url)
-        base_parsed = urlparse(self.base_url)
-        return parsed.netloc == base_parsed.netloc
-    
-    def extract_content(self, soup: BeautifulSoup, url: str) -> Dict:
-        """Extract relevant content from a documentation page"""
-        content = {
-            'url': url,
-            'title': '',
-            'content': '',
-            'headings': [],
-            'code_snippets': [],
-            'links': []
-        }
-        
-        # Extract title
-        title_tag = soup.find('h1') or soup.find('title')
-        if title_tag:
-            content['title'] = title_tag.get_text(strip=True)
-        
-        # Extract main content
-        main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='content')
-        if main_content:
-            # Extract text content
-            content['content'] = main_content.get_text(separator=' ', strip=True)
-            
-            # Extract headings
-            for heading in main_content.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-                content['headings'].append({
-                    'level': heading.name,
-                    'text': heading.get_text(strip=True)
-                })
-            
-            # Extract code snippets
-            for code in main_content.find_all(['code', 'pre']):
-                snippet = code.get_text(strip=True)
-                if len(snippet) > 10:  # Filter out very short snippets
-                    content['code_snippets'].append(snippet)
-        
-        return content
-    
-    def get_links(self, soup: BeautifulSoup, current_url: str) -> List[str]:
-        """Extract all valid documentation links from the page"""
-        links = []
-        for link in soup.find_all('a', href=True):
-            absolute_url = urljoin(current_url, link['href'])
-            # Remove fragments and query parameters for deduplication
-            clean_url = absolute_url.split('#')[0].split('?')[0]
-            if self.is_valid_url(clean_url) and clean_url not in self.visited_urls:
-                links.append(clean_url)
-        return links
-    
-    def scrape_page(self, url: str) -> bool:
-        """Scrape a single page"""
-        if url in self.visited_urls:
-            return False
-        
-        try:
-            logger.info(f"Scraping: {url}")
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            content = self.extract_content(soup, url)
-            
-            if content['content']:  # Only save if content was found
-                self.scraped_data.append(content)
-            
-            self.visited_urls.add(url)
-            
-            # Get and return new links
-            return self.get_links(soup, url)
-            
-        except Exception as e:
-            logger.error(f"Error scraping {url}: {str(e)}")
-            return []
-    
-    def scrape_documentation(self, max_pages: int = 100, delay: float = 1.0):
-        """Scrape documentation with BFS approach"""
-        urls_to_visit = [self.base_url]
-        pages_scraped = 0
-        
-        while urls_to_visit and pages_scraped < max_pages:
-            current_url = urls_to_visit.pop(0)
-            
-            if current_url in self.visited_urls:
-                continue
-            
-            new_links = self.scrape_page(current_url)
-            if new_links:
-                urls_to_visit.extend(new_links)
-            
-            pages_scraped += 1
-            time.sleep(delay)  # Be respectful to the server
-            
-            if pages_scraped % 10 == 0:
-                logger.info(f"Progress: {pages_scraped} pages scraped")
-        
-        logger.info(f"Scraping complete! Total pages: {len(self.scraped_data)}")
-    
-    def save_to_json(self, filename: str = 'capillary_docs.json'):
-        """Save scraped data to JSON file"""
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(self.scraped_data, f, indent=2, ensure_ascii=False)
-        logger.info(f"Data saved to {filename}")
-
-    def get_data(self) -> List[Dict]:
-        """Return scraped data"""
-        return self.scraped_data
-    
-if __name__ == "__main__":
-    scraper = CapillaryDocScraper()
-    scraper.scrape_documentation(max_pages=50, delay=1.5)
-    scraper.save_to_json('capillary_docs.json')
-    print(f"Scraped {len(scraper.scraped_data)} pages")
\ No newline at end of file
+import asyncio
+import aiohttp
+from aiolimiter import AsyncLimiter
+import lxml.html
+from urllib.parse import urljoin, urlsplit
+import hashlib
+import orjson
+import random
+import zstandard as zstd
+from typing import List, Dict
+import logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+class BloomFilter:
+    """Fixed-memory set membership for visited URLs; may rarely skip a page"""
+    def __init__(self, capacity: int = 100_000, num_hashes: int = 4):
+        # ~10 bits per expected item keeps the false-positive rate around 1%
+        self.size = capacity * 10
+        self.num_hashes = num_hashes
+        self.bits = bytearray(self.size // 8 + 1)
+
+    def _positions(self, item: str):
+        for seed in range(self.num_hashes):
+            digest = hashlib.blake2b(item.encode('utf-8'), digest_size=8,
+                                     salt=seed.to_bytes(8, 'little')).digest()
+            yield int.from_bytes(digest, 'little') % self.size
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7))
+                   for pos in self._positions(item))
+
+class CapillaryDocScraper:
+    def __init__(self, base_url: str = "https://docs.capillarytech.com/",
+                 max_concurrency: int = 20, max_rate: float = 5.0):
+        self.base_url = base_url
+        self.base_netloc = urlsplit(base_url).netloc
+        self.visited_urls = BloomFilter()
+        self.scraped_data: List[Dict] = []
+        self.pages_scraped = 0
+        self.max_concurrency = max_concurrency
+        self.max_rate = max_rate
+        self._sem: asyncio.BoundedSemaphore = None
+        self.limiter: AsyncLimiter = None
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        }
+
+    def extract_content(self, tree: lxml.html.HtmlElement, url: str) -> Dict:
+        """Extract relevant content from a documentation page"""
+        content = {
+            'url': url,
+            'title': '',
+            'content': '',
+            'headings': [],
+            'code_snippets': [],
+            'links': []
+        }
+
+        # Extract title
+        title_tag = tree.find('.//h1')
+        if title_tag is None:
+            title_tag = tree.find('.//title')
+        if title_tag is not None:
+            content['title'] = title_tag.text_content().strip()
+
+        # Extract main content
+        main_content = tree.find('.//main')
+        if main_content is None:
+            main_content = tree.find('.//article')
+        if main_content is None:
+            divs = tree.xpath('//div[contains(concat(" ", normalize-space(@class), " "), " content ")]')
+            main_content = divs[0] if divs else None
+        if main_content is not None:
+            # Extract text content
+            content['content'] = ' '.join(main_content.text_content().split())
+
+            # Extract headings
+            for heading in main_content.xpath('.//h1|.//h2|.//h3|.//h4|.//h5|.//h6'):
+                content['headings'].append({
+                    'level': heading.tag,
+                    'text': heading.text_content().strip()
+                })
+
+            # Extract code snippets
+            for code in main_content.xpath('.//code|.//pre'):
+                snippet = code.text_content().strip()
+                if len(snippet) > 10:  # Filter out very short snippets
+                    content['code_snippets'].append(snippet)
+
+        return content
+
+    def get_links(self, tree: lxml.html.HtmlElement, current_url: str) -> List[str]:
+        """Extract all valid documentation links from the page"""
+        links = []
+        for href in tree.xpath('//a/@href'):
+            absolute_url = urljoin(current_url, href)
+            # One urlsplit handles domain check and fragment/query stripping
+            parts = urlsplit(absolute_url)
+            if parts.netloc != self.base_netloc:
+                continue
+            clean_url = parts._replace(query='', fragment='').geturl()
+            if clean_url not in self.visited_urls:
+                links.append(clean_url)
+        return links
+
+    RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+    async def fetch(self, session: aiohttp.ClientSession, url: str, retries: int = 5) -> bytes:
+        """Fetch a single page with exponential-backoff retries on transient errors"""
+        for attempt in range(retries):
+            try:
+                async with self.limiter:  # Be respectful to the server
+                    async with self._sem:
+                        async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                            response.raise_for_status()
+                            return await response.read()
+            except aiohttp.ClientResponseError as e:
+                if e.status not in self.RETRYABLE_STATUSES or attempt == retries - 1:
+                    raise
+                # Honor the server's Retry-After if present, else back off exponentially
+                try:
+                    wait = float(e.headers.get('Retry-After', 0)) if e.headers else 0.0
+                except ValueError:
+                    wait = 0.0
+                wait = max(wait, 2 ** attempt + random.random())
+                logger.warning(f"Got {e.status} for {url}, retrying in {wait:.1f}s")
+                await asyncio.sleep(wait)
+
+    def parse_page(self, html: bytes, url: str) -> tuple:
+        """Parse fetched HTML and return (content, links); runs in a thread"""
+        tree = lxml.html.fromstring(html)
+        content = self.extract_content(tree, url)
+        return content, self.get_links(tree, url)
+
+    async def scrape_page(self, session: aiohttp.ClientSession, url: str) -> List[str]:
+        """Scrape a single page and return newly discovered links"""
+        try:
+            logger.info(f"Scraping: {url}")
+            html = await self.fetch(session, url)
+
+            # Parsing is CPU-bound; keep it off the event loop
+            loop = asyncio.get_running_loop()
+            content, links = await loop.run_in_executor(None, self.parse_page, html, url)
+
+            if content['content']:  # Only save if content was found
+                self.scraped_data.append(content)
+
+            # Get and return new links
+            return links
+
+        except Exception as e:
+            logger.error(f"Error scraping {url}: {str(e)}")
+            return []
+
+    async def worker(self, queue: asyncio.Queue, session: aiohttp.ClientSession,
+                     max_pages: int):
+        """Consume URLs from the queue until it drains"""
+        while True:
+            url = await queue.get()
+            try:
+                if url in self.visited_urls or self.pages_scraped >= max_pages:
+                    continue
+                self.visited_urls.add(url)
+                self.pages_scraped += 1
+
+                new_links = await self.scrape_page(session, url)
+                for link in new_links:
+                    if link not in self.visited_urls:
+                        queue.put_nowait(link)
+
+                if self.pages_scraped % 10 == 0:
+                    logger.info(f"Progress: {self.pages_scraped} pages scraped")
+            finally:
+                queue.task_done()
+
+    async def _scrape_async(self, max_pages: int, num_workers: int):
+        """Run the BFS crawl with a pool of worker coroutines"""
+        queue: asyncio.Queue = asyncio.Queue()
+        queue.put_nowait(self.base_url)
+
+        # Semaphore and limiter must be created on the running loop
+        self._sem = asyncio.BoundedSemaphore(self.max_concurrency)
+        self.limiter = AsyncLimiter(max_rate=self.max_rate, time_period=1.0)
+        # Persistent connections: amortize TCP+TLS handshakes across the crawl
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency,
+                                         limit_per_host=max(self.max_concurrency // 2, 1),
+                                         keepalive_timeout=30,
+                                         force_close=False,
+                                         enable_cleanup_closed=True,
+                                         ttl_dns_cache=300)
+        async with aiohttp.ClientSession(connector=connector, headers=self.headers) as session:
+            workers = [
+                asyncio.create_task(self.worker(queue, session, max_pages))
+                for _ in range(num_workers)
+            ]
+            await queue.join()
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def scrape_documentation(self, max_pages: int = 100, num_workers: int = 32):
+        """Scrape documentation with BFS approach"""
+        asyncio.run(self._scrape_async(max_pages, num_workers))
+        logger.info(f"Scraping complete! Total pages: {len(self.scraped_data)}")
+
+    def save_to_json(self, filename: str = 'capillary_docs.json.zst'):
+        """Save scraped data to JSON, zstd-compressed for .zst filenames"""
+        with open(filename, 'wb') as f:
+            if filename.endswith('.zst'):
+                with zstd.ZstdCompressor().stream_writer(f) as writer:
+                    writer.write(orjson.dumps(self.scraped_data))
+            else:
+                f.write(orjson.dumps(self.scraped_data, option=orjson.OPT_INDENT_2))
+        logger.info(f"Data saved to {filename}")
+
+    def get_data(self) -> List[Dict]:
+        """Return scraped data"""
+        return self.scraped_data
+
+if __name__ == "__main__":
+    scraper = CapillaryDocScraper()
+    scraper.scrape_documentation(max_pages=50)
+    scraper.save_to_json('capillary_docs.json.zst')
+    print(f"Scraped {len(scraper.scraped_data)} pages")
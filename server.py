@@ -1,64 +1,309 @@
 from flask import Flask, render_template, request, jsonify
+from flask.json.provider import JSONProvider
+import ijson
 import json
+import orjson
 import os
+import pickle
+import re
+import sqlite3
+import time
+import zstandard as zstd
+from collections import Counter
+from rank_bm25 import BM25Okapi
 from datetime import datetime
 import uuid
 from typing import List, Dict
 import logging
 
+# Semantic search is optional; the bot falls back to keyword search without it
+try:
+    import faiss
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+    SEMANTIC_SEARCH_AVAILABLE = True
+except ImportError:
+    SEMANTIC_SEARCH_AVAILABLE = False
+
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+
+# Sentence boundaries: periods and newlines, collapsed in a single pass
+SENTENCE_RE = re.compile(r'[.\n]+')
+
+# Index/query tokenizer: word characters only, so punctuation never sticks
+TOKEN_RE = re.compile(r'\w+')
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class OrjsonProvider(JSONProvider):
+    """Serialize API responses with orjson; compact, no pretty-printing"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+class SessionStore:
+    """SQLite-backed conversation store with a TTL; safe across workers"""
+
+    def __init__(self, db_path: str = 'sessions.db', ttl_seconds: int = 24 * 3600,
+                 max_messages: int = 50):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        with self._connect() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                messages TEXT NOT NULL
+            )''')
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _purge_expired(self, conn: sqlite3.Connection):
+        conn.execute('DELETE FROM sessions WHERE updated_at < ?',
+                     (time.time() - self.ttl_seconds,))
+
+    def get_or_create(self, session_id: str = None) -> str:
+        """Return a live session id, creating a fresh session if needed"""
+        with self._connect() as conn:
+            self._purge_expired(conn)
+            if session_id:
+                row = conn.execute('SELECT 1 FROM sessions WHERE session_id = ?',
+                                   (session_id,)).fetchone()
+                if row:
+                    return session_id
+            session_id = str(uuid.uuid4())
+            conn.execute('INSERT INTO sessions VALUES (?, ?, ?, ?)',
+                         (session_id, datetime.now().isoformat(), time.time(), '[]'))
+            return session_id
+
+    def append_message(self, session_id: str, user: str, assistant: str):
+        """Record one user/assistant exchange in the session history"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT messages FROM sessions WHERE session_id = ?',
+                               (session_id,)).fetchone()
+            messages = json.loads(row[0]) if row else []
+            messages.append({
+                'user': user,
+                'assistant': assistant,
+                'timestamp': datetime.now().isoformat()
+            })
+            # Keep only the most recent exchanges so one long-lived session
+            # can't grow (and rewrite) an unbounded history blob
+            messages = messages[-self.max_messages:]
+            conn.execute('UPDATE sessions SET messages = ?, updated_at = ? WHERE session_id = ?',
+                         (json.dumps(messages), time.time(), session_id))
 
 # Store conversation sessions
-sessions = {}
+sessions = SessionStore()
 
 class DocBot:
     def __init__(self, docs_file: str = 'capillary_docs.json'):
+        # Prefer the zstd-compressed docs file when it exists and is at least
+        # as fresh as the plain one: the scraper writes .zst by default, and a
+        # stale checked-in .json must not shadow a newer scrape
+        zst_file = docs_file + '.zst'
+        if os.path.exists(zst_file):
+            if (not os.path.exists(docs_file)
+                    or os.path.getmtime(zst_file) >= os.path.getmtime(docs_file)):
+                docs_file = zst_file
         self.docs_file = docs_file
         self.docs_data = []
+        self.index = {}
+        self.bm25 = None
+        self.doc_cache = []
+        self.embedder = None
+        self.faiss_index = None
         self.load_docs()
-    
+
     def load_docs(self):
         """Load scraped documentation data"""
         if os.path.exists(self.docs_file):
-            with open(self.docs_file, 'r', encoding='utf-8') as f:
-                self.docs_data = json.load(f)
+            # Stream docs one page at a time instead of materializing the
+            # whole JSON parse tree up front
+            with open(self.docs_file, 'rb') as raw:
+                if self.docs_file.endswith('.zst'):
+                    with zstd.ZstdDecompressor().stream_reader(raw) as f:
+                        self.docs_data = list(ijson.items(f, 'item'))
+                else:
+                    self.docs_data = list(ijson.items(raw, 'item'))
             logger.info(f"Loaded {len(self.docs_data)} documentation pages")
+            if not self.load_search_cache():
+                self.build_index()
+                self.build_embeddings()
+                self.save_search_cache()
         else:
             logger.warning(f"Documentation file {self.docs_file} not found. Please run the scraper first.")
+
+    def cache_paths(self) -> tuple:
+        """Paths for the persisted keyword index and FAISS index"""
+        base = os.path.splitext(self.docs_file)[0]
+        return base + '.search.pkl', base + '.faiss'
+
+    def load_search_cache(self) -> bool:
+        """Load the persisted search index if it is newer than the docs file"""
+        pkl_path, faiss_path = self.cache_paths()
+        if not os.path.exists(pkl_path):
+            return False
+        docs_mtime = os.path.getmtime(self.docs_file)
+        if os.path.getmtime(pkl_path) < docs_mtime:
+            return False
+        try:
+            with open(pkl_path, 'rb') as f:
+                cached = pickle.load(f)
+            self.index = cached['index']
+            self.doc_cache = cached['doc_cache']
+            self.bm25 = cached['bm25']
+        except Exception as e:
+            logger.warning(f"Failed to load search cache, rebuilding: {e}")
+            return False
+        if (SEMANTIC_SEARCH_AVAILABLE and os.path.exists(faiss_path)
+                and os.path.getmtime(faiss_path) >= docs_mtime):
+            self.faiss_index = faiss.read_index(faiss_path)
+            self.embedder = SentenceTransformer(EMBEDDING_MODEL)
+        logger.info("Loaded search index from cache")
+        return True
+
+    def save_search_cache(self):
+        """Persist the search index so restarts skip the rebuild"""
+        pkl_path, faiss_path = self.cache_paths()
+        with open(pkl_path, 'wb') as f:
+            pickle.dump({
+                'index': self.index,
+                'doc_cache': self.doc_cache,
+                'bm25': self.bm25
+            }, f)
+        if self.faiss_index is not None:
+            faiss.write_index(self.faiss_index, faiss_path)
+        logger.info(f"Search index cached to {pkl_path}")
+
+    def build_index(self):
+        """Build an inverted index (term -> doc id -> content frequency)"""
+        self.index = {}
+        self.doc_cache = []
+        corpus = []
+        for doc_id, doc in enumerate(self.docs_data):
+            title_lower = doc.get('title', '').lower()
+            content_lower = doc.get('content', '').lower()
+            headings_lower = [h.get('text', '').lower() for h in doc.get('headings', [])]
+            # Cache the lowercased fields so queries don't re-lowercase every doc
+            self.doc_cache.append({
+                'title': title_lower,
+                'content': content_lower,
+                'headings': headings_lower
+            })
+
+            content_terms = TOKEN_RE.findall(content_lower)
+            corpus.append(content_terms)
+            title_terms = TOKEN_RE.findall(title_lower)
+            heading_terms = []
+            for heading_text in headings_lower:
+                heading_terms.extend(TOKEN_RE.findall(heading_text))
+
+            counts = Counter(content_terms)
+            # Title/heading terms get a posting too so those docs stay findable
+            for term in set(content_terms) | set(title_terms) | set(heading_terms):
+                self.index.setdefault(term, {})[doc_id] = counts.get(term, 0)
+
+        self.bm25 = BM25Okapi(corpus) if corpus else None
+        logger.info(f"Indexed {len(self.index)} unique terms")
+
+    def build_embeddings(self):
+        """Embed page contents into a FAISS index for semantic search"""
+        if not SEMANTIC_SEARCH_AVAILABLE:
+            logger.warning("sentence-transformers/faiss not installed; semantic search disabled")
+            return
+        if not self.docs_data:
+            return
+
+        self.embedder = SentenceTransformer(EMBEDDING_MODEL)
+        texts = [f"{doc.get('title', '')} {doc.get('content', '')[:2000]}"
+                 for doc in self.docs_data]
+        embeddings = self.embedder.encode(texts, normalize_embeddings=True,
+                                          show_progress_bar=False)
+        embeddings = np.asarray(embeddings, dtype='float32')
+        self.faiss_index = self._build_faiss_index(embeddings)
+        logger.info(f"Embedded {len(texts)} pages for semantic search")
+
+    @staticmethod
+    def _build_faiss_index(embeddings):
+        """Build a FAISS index, quantized to 8-bit PQ codes when the corpus allows"""
+        n, dim = embeddings.shape
+        # Normalized vectors + inner product == cosine similarity.
+        # IVFPQ stores ~4x-smaller int8 codes but needs enough vectors to
+        # train its codebooks; small corpora stay on the exact flat index.
+        if n >= 256:
+            nlist = min(64, max(4, n // 40))
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, 48, 8,
+                                     faiss.METRIC_INNER_PRODUCT)
+            index.train(embeddings)
+            index.add(embeddings)
+            index.nprobe = min(8, nlist)
+            return index
+        index = faiss.IndexFlatIP(dim)
+        index.add(embeddings)
+        return index
     
+    def semantic_scores(self, query: str, top_k: int = 10) -> Dict[int, float]:
+        """Return doc id -> cosine similarity for the closest embeddings"""
+        if self.faiss_index is None:
+            return {}
+        query_vec = self.embedder.encode([query], normalize_embeddings=True)
+        sims, ids = self.faiss_index.search(np.asarray(query_vec, dtype='float32'), top_k)
+        return {int(doc_id): float(sim)
+                for sim, doc_id in zip(sims[0], ids[0]) if doc_id >= 0}
+
     def search_docs(self, query: str, max_results: int = 3) -> List[Dict]:
-        """Simple keyword-based search in documentation"""
+        """Hybrid keyword + semantic search in documentation"""
         query_lower = query.lower()
-        query_terms = query_lower.split()
+        query_terms = TOKEN_RE.findall(query_lower)
         results = []
-        
-        for doc in self.docs_data:
-            score = 0
-            title = doc.get('title', '').lower()
-            content = doc.get('content', '').lower()
-            
+
+        # Collect candidate docs from the index instead of scanning every page
+        candidates = set()
+        for term in query_terms:
+            candidates.update(self.index.get(term, ()))
+
+        # Semantic neighbours join the candidate pool even without a keyword hit
+        sem_scores = self.semantic_scores(query)
+        candidates.update(sem_scores)
+
+        # BM25 handles term frequency, document length and term rarity in one pass
+        bm25_scores = self.bm25.get_scores(query_terms) if self.bm25 else None
+
+        for doc_id in candidates:
+            doc = self.docs_data[doc_id]
+            cached = self.doc_cache[doc_id]
+            score = sem_scores.get(doc_id, 0.0) * 25
+            title = cached['title']
+            content = cached['content']
+
             # Score based on title matches (highest weight)
             for term in query_terms:
                 if term in title:
                     score += 15
-            
+
             # Score based on exact query match
             if query_lower in title:
                 score += 20
             if query_lower in content:
                 score += 10
-            
-            # Score based on individual term frequency in content
-            for term in query_terms:
-                if len(term) > 2:  # Ignore very short terms
-                    score += content.count(term) * 2
-            
+
+            # Score content relevance with BM25 instead of raw term counts
+            if bm25_scores is not None:
+                score += bm25_scores[doc_id] * 5
+
             # Score based on headings
-            for heading in doc.get('headings', []):
-                heading_text = heading.get('text', '').lower()
+            for heading_text in cached['headings']:
                 if query_lower in heading_text:
                     score += 8
                 for term in query_terms:
@@ -77,7 +322,7 @@ class DocBot:
         # Log search results for debugging
         logger.info(f"Search for '{query}' found {len(results)} results")
         if results:
-            logger.info(f"Top result: {results[0]['doc'].get('title')} (score: {results[0]['score']})")
+            logger.info(f"Top result: {results[0]['doc'].get('title')} (score: {results[0]['score']:.1f})")
         
         return [r['doc'] for r in results[:max_results]]
     
@@ -101,7 +346,7 @@ class DocBot:
         
         # Extract relevant sentences that contain query terms
         query_terms = query.lower().split()
-        sentences = content.replace('\n', '. ').split('.')
+        sentences = SENTENCE_RE.split(content)
         sentences = [s.strip() for s in sentences if len(s.strip()) > 20]
         
         # Find sentences containing query terms
@@ -182,22 +427,13 @@ def chat():
             return jsonify({'error': 'No message provided'}), 400
         
         # Create or get session
-        if not session_id or session_id not in sessions:
-            session_id = str(uuid.uuid4())
-            sessions[session_id] = {
-                'created_at': datetime.now().isoformat(),
-                'messages': []
-            }
-        
+        session_id = sessions.get_or_create(session_id)
+
         # Get bot response
         response, sources = bot.chat(message)
-        
+
         # Store in session
-        sessions[session_id]['messages'].append({
-            'user': message,
-            'assistant': response,
-            'timestamp': datetime.now().isoformat()
-        })
+        sessions.append_message(session_id, message, response)
         
         return jsonify({
             'session_id': session_id,
@@ -220,4 +456,6 @@ def status():
     })
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Development fallback only; in production run:
+    #   gunicorn -w 4 -b 0.0.0.0:5000 server:app
+    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file